@@ -1,11 +1,97 @@
 import streamlit as st
-from firecrawl import FirecrawlApp
-from openai import OpenAI
-import requests
-import json
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
 # Assuming your LLMEnhancedAnalyzer class is in a separate file called analyzer.py
-from lg import LLMEnhancedAnalyzer, get_search_results
+from lg import LLMEnhancedAnalyzer, format_usage, get_search_results, select_competitor_urls
+
+# Custom CSS for better styling
+_CSS = """
+<style>
+.main {
+    background-color: #1a1a2e;
+    color: #ffffff;
+}
+.main-title {
+    font-size: 2.5rem;
+    color: #00d4ff;
+    text-align: center;
+    margin-bottom: 2rem;
+}
+.stButton>button {
+    background-color: #00d4ff;
+    color: white;
+    border-radius: 8px;
+    padding: 0.5rem 2rem;
+    margin-right: 1rem;
+}
+.stButton>button:hover {
+    background-color: #00aaff;
+}
+.stTextInput div input {
+    background-color: #2e2e4d;
+    color: #ffffff;
+    border: 1px solid #444;
+}
+.stTextArea textarea {
+    background-color: #2e2e4d !important;
+    color: #ffffff !important;
+    border: 1px solid #444 !important;
+    border-radius: 8px !important;
+    padding: 1rem !important;
+    height: 500px !important;
+}
+.stTextArea textarea:disabled {
+    background-color: #2e2e4d !important;
+    color: #ffffff !important;
+    opacity: 1 !important;
+}
+</style>
+"""
+
+# One analyzer per API key pair, shared across reruns and sessions so its
+# Firecrawl/OpenAI clients (and their connection pools) are reused
+@st.cache_resource(show_spinner=False)
+def _get_analyzer(firecrawl_api_key: str, openai_api_key: str) -> LLMEnhancedAnalyzer:
+    analyzer = LLMEnhancedAnalyzer(
+        firecrawl_api_key=firecrawl_api_key,
+        openai_api_key=openai_api_key
+    )
+    # Content parameters are fixed for the app, so set them once here rather
+    # than mutating the shared instance on every click
+    analyzer.set_content_parameters(
+        intent="commercial",
+        keywords=[]
+    )
+    return analyzer
+
+# Cached SERP step so repeat queries skip SerpAPI. Scrapes and LLM responses are
+# cached per URL / per request on disk by the analyzer itself.
+# Arguments prefixed with "_" (API keys) are not hashed.
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_serp(query: str, _api_key: str):
+    serp_data = get_search_results(query, _api_key)
+    if not serp_data:
+        # Raise instead of returning None so the failure is not cached
+        raise RuntimeError("Failed to fetch SERP data. Please try again.")
+    return serp_data
+
+# Minimum seconds between redraws while an outline streams in; each redraw
+# resends the whole text to the browser, so per-token updates are too costly
+_STREAM_REFRESH_INTERVAL = 0.1
+
+def _stream_to_placeholder(placeholder, chunks) -> str:
+    """Render streamed text chunks into a placeholder at a throttled rate and return the full text"""
+    parts = []
+    last_refresh = 0.0
+    for chunk in chunks:
+        parts.append(chunk)
+        now = time.monotonic()
+        if now - last_refresh >= _STREAM_REFRESH_INTERVAL:
+            # A plain text element is overwritten in place, unlike a widget
+            # which would need a fresh key for every partial render
+            placeholder.text("".join(parts))
+            last_refresh = now
+    return "".join(parts)
 
 def main():
     # Set page configuration
@@ -15,49 +101,9 @@ def main():
         layout="wide"
     )
 
-    # Custom CSS for better styling
-    st.markdown("""
-        <style>
-        .main {
-            background-color: #1a1a2e;
-            color: #ffffff;
-        }
-        .main-title {
-            font-size: 2.5rem;
-            color: #00d4ff;
-            text-align: center;
-            margin-bottom: 2rem;
-        }
-        .stButton>button {
-            background-color: #00d4ff;
-            color: white;
-            border-radius: 8px;
-            padding: 0.5rem 2rem;
-            margin-right: 1rem;
-        }
-        .stButton>button:hover {
-            background-color: #00aaff;
-        }
-        .stTextInput div input {
-            background-color: #2e2e4d;
-            color: #ffffff;
-            border: 1px solid #444;
-        }
-        .stTextArea textarea {
-            background-color: #2e2e4d !important;
-            color: #ffffff !important;
-            border: 1px solid #444 !important;
-            border-radius: 8px !important;
-            padding: 1rem !important;
-            height: 500px !important;
-        }
-        .stTextArea textarea:disabled {
-            background-color: #2e2e4d !important;
-            color: #ffffff !important;
-            opacity: 1 !important;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    # Custom CSS for better styling. Streamlit drops elements a rerun does not
+    # re-emit, so this has to be written on every run to keep the styling.
+    st.markdown(_CSS, unsafe_allow_html=True)
 
     # Header
     st.markdown('<h1 class="main-title">Landing Page Outline Generator</h1>', unsafe_allow_html=True)
@@ -68,6 +114,13 @@ def main():
     # Initialize session state for outline
     if 'outline' not in st.session_state:
         st.session_state.outline = ""
+    if 'usage' not in st.session_state:
+        st.session_state.usage = []
+
+    # Right column header and a placeholder the outline is streamed into
+    with col2:
+        st.subheader("Output")
+        output_placeholder = st.empty()
 
     # Left column: Input and buttons
     with col1:
@@ -84,16 +137,6 @@ def main():
         with btn_col1:
             get_outline_btn = st.button("Get Outline")
 
-        with btn_col2:
-            # Download button (disabled until outline is generated)
-            download_btn = st.download_button(
-                label="Download",
-                data=st.session_state.outline,
-                file_name=f"landing_page_outline_{search_query.replace(' ', '_')}.txt" if search_query else "landing_page_outline.txt",
-                mime="text/plain",
-                disabled=not st.session_state.outline
-            )
-
         # Handle button click
         if get_outline_btn:
             if not search_query:
@@ -107,57 +150,70 @@ def main():
                         OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
                         SERPAPI_KEY = st.secrets["SERPAPI_KEY"]
 
-                        # Fetch SERP data
-                        serp_data = get_search_results(search_query, SERPAPI_KEY)
-                        if not serp_data:
-                            st.error("Failed to fetch SERP data. Please try again.")
-                            return
+                        # Fetch SERP data and get the (cached) analyzer in parallel
+                        with ThreadPoolExecutor(max_workers=2) as executor:
+                            serp_future = executor.submit(_cached_serp, search_query, SERPAPI_KEY)
+                            analyzer_future = executor.submit(_get_analyzer, FIRECRAWL_API_KEY, OPENAI_API_KEY)
 
-                        # Initialize analyzer
-                        analyzer = LLMEnhancedAnalyzer(
-                            firecrawl_api_key=FIRECRAWL_API_KEY,
-                            openai_api_key=OPENAI_API_KEY
-                        )
-
-                        # Set content parameters
-                        analyzer.set_content_parameters(
-                            intent="commercial",
-                            keywords=[]
-                        )
+                            analyzer = analyzer_future.result()
+                            serp_data = serp_future.result()
 
                         # Extract URLs to scrape
-                        urls_to_scrape = [
-                            result['link']
-                            for result in serp_data.get('organic_results', [])[:5]
-                        ]
+                        urls_to_scrape = select_competitor_urls(serp_data)
 
-                        # Scrape competitor content
+                        # Scrape competitor content; successful pages come from the
+                        # analyzer's per-URL disk cache, failed ones are retried next run
                         scraped_data = analyzer.scrape_competitor_content(urls_to_scrape)
 
-                        # Generate enhanced outline
-                        enhanced_outline = analyzer.generate_enhanced_outline(serp_data, scraped_data)
-                        st.session_state.outline = enhanced_outline
+                        # Stream the enhanced outline into the output box, collecting
+                        # token usage per LLM call and how the stream finished
+                        usage = []
+                        finish_reasons = []
+                        outline_stream = analyzer.generate_enhanced_outline_stream(
+                            serp_data, scraped_data, on_usage=usage.append, on_finish=finish_reasons.append
+                        )
+                        outline = _stream_to_placeholder(output_placeholder, outline_stream)
+
+                        # An outline missing a required section or cut off at the token
+                        # cap is regenerated with the fallback model, streamed over the first attempt
+                        fallback_stream = analyzer.generate_fallback_outline_stream(
+                            serp_data, scraped_data, outline, on_usage=usage.append,
+                            truncated='length' in finish_reasons
+                        )
+                        outline = _stream_to_placeholder(output_placeholder, fallback_stream) or outline
+
+                        st.session_state.outline = outline
+                        st.session_state.usage = usage
 
                     # Show success message after spinner completes
                     st.success("Outline generated successfully!")
-                    
-                    # Re-run the app to update the UI with the outline
-                    st.rerun()
 
                 except Exception as e:
                     st.error(f"An error occurred: {str(e)}")
                     st.write("Please check your API keys and try again.")
 
+        with btn_col2:
+            # Download button (disabled until outline is generated). Created after
+            # the handler so it picks up a freshly generated outline on the same run.
+            download_btn = st.download_button(
+                label="Download",
+                data=st.session_state.outline,
+                file_name=f"landing_page_outline_{search_query.replace(' ', '_')}.txt" if search_query else "landing_page_outline.txt",
+                mime="text/plain",
+                disabled=not st.session_state.outline
+            )
+
     # Right column: Output text box
     with col2:
-        st.subheader("Output")
-        st.text_area(
+        output_placeholder.text_area(
             "Generated Outline",
             value=st.session_state.outline,
             height=500,
             disabled=True,
             placeholder="Your generated outline will appear here..."
         )
+        for usage in st.session_state.usage:
+            st.caption(f"LLM tokens: {format_usage(usage)}")
 
     # Footer
     st.markdown("""
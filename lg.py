@@ -1,165 +1,169 @@
-from firecrawl import FirecrawlApp
-import json
-from datetime import datetime
-from typing import List, Dict
+import orjson
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Dict, Optional, Sequence, Tuple
 import time
+import random
+import threading
 import re
-from bs4 import BeautifulSoup
-from collections import Counter
-from openai import OpenAI
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from itertools import chain, islice
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from collections import Counter, deque
 import requests
-import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from diskcache import Cache
+# firecrawl, openai/httpx, lxml and streamlit are imported where they are used:
+# together they take over a second to import and not every entry point needs them
+if TYPE_CHECKING:
+    import lxml.html
 
-class LLMEnhancedAnalyzer:
-    def __init__(self, firecrawl_api_key: str, openai_api_key: str):
-        self.firecrawl = FirecrawlApp(api_key=firecrawl_api_key)
-        self.openai_client = OpenAI(api_key=openai_api_key)
-        self.article_intent = ""
-        self.secondary_keywords = []
+# Social/video hosts whose pages carry no scrapeable landing page copy
+_BLOCKED_DOMAINS = re.compile(
+    r'^https?://(?:[^/?#]+\.)?(?:youtube|reddit|twitter|facebook|tiktok|instagram)\.com(?:[/:?#]|$)',
+    re.IGNORECASE
+)
 
-    def set_content_parameters(self, intent: str, keywords: List[str]):
-        """Set the content parameters for better LLM analysis"""
-        self.article_intent = intent
-        self.secondary_keywords = keywords
+# Query parameters that only track the click; they are ignored when deduping URLs
+_TRACKING_PARAM_RE = re.compile(
+    r'^(?:utm_\w+|gclid|gbraid|wbraid|dclid|fbclid|msclkid|yclid|igshid|mc_cid|mc_eid|_ga|_gl)$',
+    re.IGNORECASE
+)
 
-    def extract_serp_data(self, data: Dict) -> Dict:
-        """Extract data from SERP API results"""
-        return {
-            'organic_results': self.extract_organic_results(data),
-            'paa_questions': self.extract_paa_questions(data),
-            'related_searches': self.extract_related_searches(data)
-        }
+# Word tokenizer for text analysis, compiled once at import
+_WORD_RE = re.compile(r'\b\w+\b')
 
-    def extract_organic_results(self, data: Dict) -> List[Dict]:
-        """Extract organic results from SERP data"""
-        results = []
-        for article in data.get('organic_results', []):
-            result = {
-                'title': article.get('title', ''),
-                'link': article.get('link', ''),
-                'date': article.get('date', ''),
-                'snippet': article.get('snippet', ''),
-                'position': article.get('position', ''),
-                'displayed_link': article.get('displayed_link', '')
-            }
-            results.append(result)
-        return results
+# Markdown element patterns for scrapes fetched as markdown
+_MD_HEADING_RE = re.compile(r'^#{1,6}\s', re.M)
+# Setext heading: a text line (not a list item, ATX heading or rule) underlined with = or -
+_MD_SETEXT_HEADING_RE = re.compile(
+    r'^(?![ \t]*(?:[-*+]|\d+[.)])[ \t])(?![ \t]*#)(?![ \t]*(?:[-*_=][ \t]*)+$)[ \t]{0,3}\S.*\n[ \t]{0,3}(?:=+|-+)[ \t]*$',
+    re.M
+)
+_MD_LIST_RE = re.compile(r'(?:^[ \t]*(?:[-*+]|\d+[.)])[ \t].*(?:\n|$))+', re.M)  # one match per run of items
+_MD_TABLE_RE = re.compile(r'^\|?[ \t]*:?-{3,}:?[ \t]*(?:\|[ \t]*:?-{3,}:?[ \t]*)+\|?[ \t]*$', re.M)  # header rule
+_MD_IMAGE_RE = re.compile(r'!\[[^\]]*\]\(')
+_MD_LINK_RE = re.compile(r'(?<!!)\[[^\]]*\]\(')
+# Markdown syntax that isn't page copy, removed before words and topics are counted:
+# whole-line rules and underlines (setext, horizontal and table header rules),
+# line-start heading/quote/list markers, and inline images, link targets, brackets and pipes
+_MD_SYNTAX_LINE_RE = re.compile(r'^[ \t]*(?:[-*_=|:][ \t]*)+(?:\n|$)', re.M)
+_MD_SYNTAX_PREFIX_RE = re.compile(r'^[ \t]*(?:(?:#{1,6}|>|[-*+]|\d+[.)])[ \t]+)+', re.M)
+_MD_SYNTAX_INLINE_RE = re.compile(r'!\[[^\]]*\]\([^)]*\)|\]\([^)]*\)|[\[\]]')
 
-    def extract_paa_questions(self, data: Dict) -> List[Dict]:
-        """Extract People Also Ask questions"""
-        questions = []
-        for question in data.get('related_questions', []):
-            questions.append({
-                'question': question.get('question', ''),
-                'snippet': question.get('snippet', ''),
-                'title': question.get('title', '')
-            })
-        return questions
-
-    def extract_related_searches(self, data: Dict) -> List[Dict]:
-        """Extract related searches"""
-        return [{'query': search.get('query', '')} 
-                for search in data.get('related_searches', [])]
+# Element totals for HTML pages, each counted by lxml in C without building node lists
+_HTML_ELEMENT_XPATHS = {
+    'lists': 'count(//ul|//ol)',
+    'tables': 'count(//table)',
+    'images': 'count(//img)',
+    'links': 'count(//a)',
+    'headings': 'count(//h1|//h2|//h3|//h4|//h5|//h6)',
+}
 
-    def scrape_competitor_content(self, urls: List[str]) -> List[Dict]:
-        """Scrape and analyze competitor content"""
-        scraped_content = []
-        
-        for url in urls:
-            try:
-                # Basic scraping parameters
-                params = {
-                    'formats': ['markdown', 'html']
-                }
-                
-                # Perform the scrape with retry logic
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        result = self.firecrawl.scrape_url(url, params=params)
-                        
-                        # Get content with fallback
-                        content = result.get('html', result.get('markdown', ''))
-                        
-                        # Analyze the content
-                        analysis = self.analyze_content(content)
-                        
-                        content_data = {
-                            'url': url,
-                            'content': content,
-                            'analysis': analysis
-                        }
-                        
-                        scraped_content.append(content_data)
-                        print(f"Successfully scraped: {url}")
-                        break
-                    except Exception as e:
-                        if attempt == max_retries - 1:
-                            print(f"Error scraping {url}: {str(e)}")
-                        else:
-                            print(f"Retry {attempt + 1} for {url}")
-                            time.sleep(2)
-                
-            except Exception as e:
-                print(f"Error processing {url}: {str(e)}")
-                continue
-                
-        return scraped_content
+# Common English words that carry no topic signal, used to filter key topics
+# (which also drop words of three letters or fewer) and common phrases
+_STOPWORDS = frozenset("""
+    a an and are as at be but by can do for get how if in is it its of on or
+    our so the to us was we who why you all any few has had her him his
+    may nor not now off one own per she too two way yet
+    about above across after afterwards again against almost alone along already
+    also although always among amongst another anyone anything anyway anywhere
+    around back because become becomes been before behind being below beside
+    besides between beyond both cannot could does doing done down during each
+    either else elsewhere enough even ever every everyone everything everywhere
+    except fifteen fifty first five following former formerly forty four
+    from front full further give have having hence here hereby herein hers herself
+    himself however hundred indeed into itself just keep last latter least less
+    made many might mine more moreover most mostly much must myself namely neither
+    never nevertheless next nine nobody none nothing nowhere often once only onto
+    other others otherwise ours ourselves over perhaps please rather same seem
+    seemed seems several should show side since sixty some someone something
+    sometime sometimes somewhere still such take than that their theirs them
+    themselves then thence there thereafter thereby therefore therein these they
+    thing things third this those though three through throughout thus together
+    toward towards twelve twenty under until upon using very want well were what
+    whatever when whence whenever where whereas whether which while whither whoever
+    whole whom whose will with within without would your yours yourself yourselves
+""".split())
 
-    def analyze_content(self, content: str) -> Dict:
-        """Analyze scraped content for insights"""
-        try:
-            soup = BeautifulSoup(content, 'html.parser')
-            text_content = soup.get_text() if soup.get_text() else content
+# Translation table that deletes markdown emphasis markers from LLM output
+_STAR_TABLE = str.maketrans('', '', '*')
 
-            analysis = {
-                'word_count': len(text_content.split()),
-                'common_phrases': self.extract_common_phrases(text_content),
-                'content_structure': self.analyze_content_structure(text_content),
-                'key_topics': self.extract_key_topics(text_content),
-                'content_elements': self.identify_content_elements(content)
-            }
-            return analysis
-        except Exception as e:
-            print(f"Error in content analysis: {str(e)}")
-            return {}
+# Upper bound on concurrent Firecrawl scrapes
+_MAX_SCRAPE_WORKERS = 8
 
-    def get_llm_analysis(self, context: str, system_prompt: str) -> str:
-        """Get LLM analysis using OpenAI API"""
-        try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": context}
-                ],
-                temperature=0.7,
-                max_tokens=3000
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"Error in LLM analysis: {str(e)}")
-            return ""
+# Overall time budget for a batch of scrapes; slower URLs are dropped
+_SCRAPE_BATCH_TIMEOUT = 120
 
-    def analyze_with_llm(self, scraped_data: List[Dict], serp_data: Dict) -> Dict:
-        """Analyze content using LLM"""
-        
-        # Prepare context for LLM
-        context = self.prepare_llm_context(scraped_data, serp_data)
-        
-        # Define system prompts
-        prompts = {
-            'outline_structure': """
-You're an expert content strategist and CRO specialist. Using the input fields, SERP data, and competitor analysis, create a high-converting, SEO-optimized landing page outline following the page structure below. Combine the best of SERP results for {search_query}, aligning with EEAT, AEO, GEO, and CRO best practices. Include definitions, comparisons, and how-to query handling where relevant.
-Input Fields:
-    Primary Keyword: {search_query}
-    Business Type: (infer from {search_query})
-    Secondary Keywords: {secondary_keywords}
-    SERP Data: {serp_data}
-    Scraped Competitor Data: {scraped_data}
+# Retry backoff: exponential from _BACKOFF_BASE seconds, capped, plus random jitter
+# so concurrent workers that failed together don't retry in lockstep
+_BACKOFF_BASE = 1.0
+_BACKOFF_CAP = 60.0
+
+# Shared keep-alive connection pool for SerpAPI requests
+# Retries (with backoff and Retry-After) are handled by urllib3 rather than by hand
+_SERP_SESSION = requests.Session()
+_SERP_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        backoff_jitter=_BACKOFF_BASE,
+        backoff_max=_BACKOFF_CAP,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False
+    )
+))
+
+# Attempts the OpenAI SDK makes on 429/5xx/connection errors; it backs off
+# with jitter and honors Retry-After on its own
+_LLM_MAX_RETRIES = 5
+
+# OpenAI account limits for the model in use (requests and tokens per minute).
+# Requests are held back client-side before they would be rejected with a 429.
+_LLM_RPM_LIMIT = 500
+_LLM_TPM_LIMIT = 200000
+# Completion cap. OpenAI counts the full cap against the TPM limit up front, so
+# it is kept tight; an answer cut off at the cap is retried with the fallback model
+_LLM_MAX_TOKENS = 2000
+# Upper bound on the per-query user message; the compact SERP and competitor
+# summaries normally come in well under it
+_LLM_CONTEXT_TOKEN_BUDGET = 3000
+
+# On-disk cache for API responses, shared by every analyzer in the process
+# Next to this module rather than the working directory, so every entry point shares it
+_CACHE_DIR = Path(__file__).resolve().parent / '.cache'
+_LLM_CACHE_TTL = 86400  # 24 hours
+_SCRAPE_CACHE_TTL = 86400  # 24 hours
+# Part of every scrape cache key; bump it when the Firecrawl request changes
+# what a scraped body contains (2: onlyMainContent bodies)
+_SCRAPE_CACHE_VERSION = 2
+_SERP_CACHE_TTL = 86400  # 24 hours
+
+@lru_cache(maxsize=1)
+def _disk_cache() -> Cache:
+    return Cache(str(_CACHE_DIR))
+
+def _llm_cache_key(model: str, system_prompt: str, context: str) -> str:
+    digest = hashlib.sha256(f"{model}\0{system_prompt}\0{context}".encode('utf-8')).hexdigest()
+    return f"llm::{digest}"
+
+# System prompt for the outline. Kept free of per-query data so it is a stable,
+# cacheable prefix; everything query-specific goes in the user message.
+_OUTLINE_STRUCTURE_PROMPT = """
+You're an expert content strategist and CRO specialist. Using the input fields, SERP data, and competitor analysis provided in the user message, create a high-converting, SEO-optimized landing page outline following the page structure below. Combine the best of SERP results for the primary keyword, aligning with EEAT, AEO, GEO, and CRO best practices. Include definitions, comparisons, and how-to query handling where relevant.
+Input Fields (provided in the user message):
+    Primary Keyword
+    Business Type: (infer from the primary keyword)
+    Secondary Keywords
+    SERP Data: top-ranking articles, People Also Ask questions, related searches
+    Scraped Competitor Data
 Instructions:
 ✅ Step 1: SERP Analysis
-    Search {search_query} targeting the USA market.
+    Search the primary keyword targeting the USA market.
     Analyze the top-ranking pages (organic results, paid ads, featured snippets).
     Understand page structure, user intent, keyword variations, formatting style, and the presence of trust signals (EEAT).
 ✅ Step 2: High-Converting Landing Page Outline
@@ -171,7 +175,7 @@ Instructions:
 Content Outline – Based on $10M Landing Page Framework:
 
 🎯 VISUAL HIERARCHY LAYER
-H1 (3–5 options) – Powerful headlines using {search_query} + unique value prop
+H1 (3–5 options) – Powerful headlines using the primary keyword + unique value prop
 Main Offer Above the Fold: Clear, compelling headline with transformation-focused benefit
 Supporting Subhead: Highlights key pain point or challenge
 First CTA Button: Action-oriented copy (e.g., “Get Started Today”)
@@ -213,7 +217,7 @@ Reinforce who it’s best for (budget, business size, needs)
 Adds exclusivity and value
 FAQs (5–10 Questions)
 Include definition, comparison, and how-to query angles
-5-7 strategic questions based on PAA or related searches from {serp_data}
+5-7 strategic questions based on PAA or related searches from the SERP data
 Questions in natural language, brief and helpful answers
 Example Qs:
 What is [search_query]?
@@ -254,23 +258,405 @@ Add side-by-side tables comparing alternatives (e.g., “X vs Y”).
 For How-To Queries:
 Include a step-by-step or process visual in “How It Works” + FAQ entries
 """
+
+# SERP fields kept per organic result and per People Also Ask question
+_ORGANIC_KEYS = ('title', 'link', 'date', 'snippet', 'position', 'displayed_link')
+_PAA_KEYS = ('question', 'snippet', 'title')
+
+# System prompts per analysis aspect, built once at import
+_PROMPTS = {
+    'outline_structure': _OUTLINE_STRUCTURE_PROMPT
+}
+
+# Lines the final outline text is wrapped in
+_OUTLINE_HEADER = "Meta Information:\n"
+_OUTLINE_FOOTER = "\nEND"
+
+# Sections (matched case-insensitively) an aspect's output must contain; output
+# missing any of them is regenerated with the fallback model
+_REQUIRED_SECTIONS = {
+    'outline_structure': ('meta title', 'meta description', 'faq')
+}
+
+class RateLimiter:
+    """Sliding one-minute window over requests and tokens, shared across threads"""
+
+    def __init__(self, rpm_limit: int, tpm_limit: int, window: float = 60.0):
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.window = window
+        self._events = deque()  # (monotonic timestamp, tokens) per admitted request
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        """Block until a request of `tokens` fits in both the request and token budgets"""
+        tokens = min(tokens, self.tpm_limit)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._events and now - self._events[0][0] >= self.window:
+                    self._events.popleft()
+
+                used = sum(event_tokens for _, event_tokens in self._events)
+                if len(self._events) < self.rpm_limit and used + tokens <= self.tpm_limit:
+                    self._events.append((now, tokens))
+                    return
+
+                # Wait for the oldest request to leave the window, then re-check
+                wait = self._events[0][0] + self.window - now
+            time.sleep(max(wait, 0.01))
+
+class LLMEnhancedAnalyzer:
+    def __init__(self, firecrawl_api_key: str, openai_api_key: str, load_from_cache: bool = True,
+                 scrape_html: bool = False, model: str = "gpt-4o-mini", fallback_model: str = "gpt-4o"):
+        from firecrawl import FirecrawlApp
+        from openai import OpenAI
+        import httpx
+
+        self.firecrawl = FirecrawlApp(api_key=firecrawl_api_key)
+        # Markdown is a fraction of the HTML payload and carries everything the
+        # analysis reads; HTML stays available for exact tag counts
+        self.scrape_format = 'html' if scrape_html else 'markdown'
+        # When False, scrapes and LLM calls bypass cached responses but still refresh them
+        self.load_from_cache = load_from_cache
+        # One HTTP/2 connection is multiplexed across concurrent LLM calls, so the
+        # TLS handshake is paid once per analyzer rather than once per request
+        self.openai_client = OpenAI(
+            api_key=openai_api_key,
+            max_retries=_LLM_MAX_RETRIES,
+            http_client=httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+                timeout=60
+            )
+        )
+        self.llm_rate_limiter = RateLimiter(_LLM_RPM_LIMIT, _LLM_TPM_LIMIT)
+        # The smaller model handles outline structure at a fraction of the cost;
+        # the larger one is only called when its output fails validation
+        self.model = model
+        self.fallback_model = fallback_model
+        self.article_intent = ""
+        self.secondary_keywords = []
+
+    def set_content_parameters(self, intent: str, keywords: List[str]):
+        """Set the content parameters for better LLM analysis"""
+        self.article_intent = intent
+        self.secondary_keywords = keywords
+
+    def extract_serp_data(self, data: Dict, organic_limit: Optional[int] = None) -> Dict:
+        """Extract data from SERP API results"""
+        return {
+            'organic_results': self.extract_organic_results(data, organic_limit),
+            'paa_questions': self.extract_paa_questions(data),
+            'related_searches': self.extract_related_searches(data)
         }
+
+    # Each extractor stops at `limit` rows (None keeps them all) so a caller that
+    # only uses the top rows never copies the long tail of a large SERP
+    def extract_organic_results(self, data: Dict, limit: Optional[int] = None) -> List[Dict]:
+        """Extract organic results from SERP data"""
+        return [{key: article.get(key, '') for key in _ORGANIC_KEYS}
+                for article in islice(data.get('organic_results', []), limit)]
+
+    def extract_paa_questions(self, data: Dict, limit: Optional[int] = None) -> List[Dict]:
+        """Extract People Also Ask questions"""
+        return [{key: question.get(key, '') for key in _PAA_KEYS}
+                for question in islice(data.get('related_questions', []), limit)]
+
+    def extract_related_searches(self, data: Dict, limit: Optional[int] = None) -> List[Dict]:
+        """Extract related searches"""
+        return [{'query': search.get('query', '')}
+                for search in islice(data.get('related_searches', []), limit)]
+
+    def scrape_competitor_content(self, urls: Sequence[str], keep_raw: bool = False,
+                                  full_analysis: bool = False) -> List[Dict]:
+        """Scrape and analyze competitor content concurrently.
+
+        Only the analysis is kept per URL; pass keep_raw=True to also keep the
+        raw page content under 'content' for debugging. The analysis holds just
+        what the outline prompt reads unless full_analysis=True (see analyze_content).
+        """
+        if not urls:
+            return []
+
+        # Scrapes are network-bound, so overlap them in a bounded thread pool. Every
+        # fetch shares the batch deadline so its retry backoff can't outlive the batch.
+        deadline = time.monotonic() + _SCRAPE_BATCH_TIMEOUT
+        executor = ThreadPoolExecutor(max_workers=min(_MAX_SCRAPE_WORKERS, len(urls)))
+        futures = {
+            executor.submit(self._scrape_one, url, keep_raw, full_analysis, deadline): url
+            for url in urls
+        }
+        results = {}
+        try:
+            for future in as_completed(futures, timeout=_SCRAPE_BATCH_TIMEOUT):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"Error processing {futures[future]}: {str(e)}")
+        except FuturesTimeoutError:
+            pending = [url for future, url in futures.items() if not future.done()]
+            print(f"Scrape timed out, skipping: {', '.join(pending)}")
+        finally:
+            # Don't hold the caller on stragglers; keep whatever finished in time.
+            # By design a straggler already inside a Firecrawl call keeps running in
+            # the background: it finishes that call (caching the page for the next
+            # run) but starts no further retries, as its deadline has passed.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        # Keep SERP order regardless of completion order. Mirrored or syndicated
+        # pages can come back under different URLs; the highest-ranked copy of a
+        # page body is kept, so the same query always yields the same pages.
+        scraped = []
+        seen_digests = set()
+        for url in urls:
+            if not results.get(url):
+                continue
+            digest, content_data = results[url]
+            if digest is not None:
+                if digest in seen_digests:
+                    print(f"Duplicate content, skipping: {url}")
+                    continue
+                seen_digests.add(digest)
+            scraped.append(content_data)
+        return scraped
+
+    def _scrape_one(self, url: str, keep_raw: bool = False, full_analysis: bool = False,
+                    deadline: float = None) -> Tuple[Optional[bytes], Dict]:
+        """Scrape and analyze a single competitor URL, returning None on failure.
+
+        Returns (digest of the page body, content data); the digest is None for
+        an empty page. deadline (a time.monotonic() value) bounds the fetch's retries.
+        """
+        try:
+            # Page content is stable for hours, so reuse a recent scrape of the same URL
+            cache_key = f"scrape::v{_SCRAPE_CACHE_VERSION}::{self.scrape_format}::{url}"
+            content = _disk_cache().get(cache_key) if self.load_from_cache else None
+            if content is not None:
+                print(f"Scrape cache hit: {url}")
+            else:
+                content = self._fetch_content(url, deadline)
+                if content is None:
+                    return None
+                if content:
+                    _disk_cache().set(cache_key, content, expire=_SCRAPE_CACHE_TTL)
+
+            # Analyze the content
+            analysis = self.analyze_content(content, full=full_analysis)
+
+            content_data = {
+                'url': url,
+                'analysis': analysis
+            }
+            if keep_raw:
+                content_data['content'] = content
+            # Empty pages carry no body to compare, so they get no digest
+            digest = hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest() if content else None
+            return digest, content_data
+        except Exception as e:
+            print(f"Error processing {url}: {str(e)}")
+
+        return None
+
+    def _fetch_content(self, url: str, deadline: float = None) -> str:
+        """Fetch a URL's content from Firecrawl with retries, returning None on failure.
+
+        No retry is started whose backoff would end past deadline (time.monotonic()).
+        """
+        # Basic scraping parameters; only the format the analysis reads is requested,
+        # and nav/footer boilerplate is dropped so it doesn't skew topic counts
+        params = {
+            'formats': [self.scrape_format],
+            'onlyMainContent': True
+        }
+
+        # Perform the scrape with retry logic
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                result = self.firecrawl.scrape_url(url, params=params)
+
+                print(f"Successfully scraped: {url}")
+                return result.get(self.scrape_format, '')
+            except Exception as e:
+                if attempt == max_retries - 1 or not _is_retryable(e):
+                    # 404s, auth failures and blocked pages won't succeed on a retry
+                    print(f"Error scraping {url}: {str(e)}")
+                    break
+                delay = _retry_delay(attempt, e)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    print(f"Error scraping {url}: {str(e)} (no time left to retry)")
+                    break
+                print(f"Retry {attempt + 1} for {url}")
+                time.sleep(delay)
+
+        return None
+
+    def analyze_content(self, content: str, full: bool = False) -> Dict:
+        """Analyze scraped content for insights.
+
+        By default only word_count and key_topics are computed, which is all the
+        outline prompt uses; full=True adds common_phrases, content_structure
+        and content_elements.
+        """
+        try:
+            if _looks_like_html(content):
+                tree = _parse_html(content)
+                if tree is not None:
+                    # Extract the text once; newlines are kept for the paragraph count
+                    text_content = tree.text_content()
+                    content_elements = self.identify_content_elements(tree) if full else None
+                else:
+                    # An empty or comment-only document has no copy to count
+                    text_content = ''
+                    content_elements = _content_elements(Counter()) if full else None
+            else:
+                # Markdown (or plain text) is counted with regexes; its syntax is
+                # dropped so markers and URLs don't count as words or topics
+                text_content = _markdown_text(content)
+                content_elements = _content_elements(_markdown_tag_counts(content)) if full else None
+
+            # Tokenize once and derive every text statistic from that pass
+            word_counts, phrase_counts, total_paragraphs, total_words = _one_pass_stats(
+                text_content, with_phrases=full
+            )
+
+            analysis = {
+                'word_count': total_words,
+                'key_topics': _top_words(word_counts)
+            }
+            if full:
+                analysis.update({
+                    'common_phrases': _top_phrases(phrase_counts),
+                    'content_structure': _content_structure(total_paragraphs, total_words),
+                    'content_elements': content_elements
+                })
+            return analysis
+        except Exception as e:
+            print(f"Error in content analysis: {str(e)}")
+            return {}
+
+    def get_llm_analysis(self, context: str, system_prompt: str, on_usage: Callable = None,
+                         required_sections: Sequence[str] = ()) -> str:
+        """Get LLM analysis using OpenAI API, reporting token usage to on_usage.
+
+        If the output is missing any of required_sections or was cut off at
+        max_tokens, it is regenerated once with the fallback model.
+        """
+        finish_reasons = []
+        text = "".join(self.stream_llm_analysis(
+            context, system_prompt, on_usage=on_usage, on_finish=finish_reasons.append
+        ))
+
+        if self._needs_fallback(text, required_sections, truncated='length' in finish_reasons):
+            fallback_text = "".join(self.stream_llm_analysis(
+                context, system_prompt, on_usage=on_usage, model=self.fallback_model
+            ))
+            text = fallback_text or text
+
+        return text
+
+    def _needs_fallback(self, text: str, required_sections: Sequence[str], truncated: bool = False) -> bool:
+        """Whether non-empty output is incomplete and a different fallback model is set.
+
+        Output is incomplete if it lacks a required section or was truncated at max_tokens.
+        """
+        missing = _missing_sections(text, required_sections)
+        problems = [f"missing {', '.join(missing)}"] if missing else []
+        if truncated:
+            problems.append(f"cut off at {_LLM_MAX_TOKENS} tokens")
+        if not (text and problems and self.fallback_model and self.fallback_model != self.model):
+            return False
+        print(f"{self.model} output {'; '.join(problems)}; retrying with {self.fallback_model}")
+        return True
+
+    def stream_llm_analysis(self, context: str, system_prompt: str, on_usage: Callable = None,
+                            model: str = None, on_finish: Callable = None) -> Iterator[str]:
+        """Stream LLM analysis text chunks from the OpenAI API as they arrive.
+
+        on_finish is called with the completion's finish_reason ('stop' for a
+        cached answer) once the stream ends; it is not called if the request fails.
+        """
+        model = model or self.model
+
+        # Identical requests are answered from the on-disk response cache
+        cache_key = _llm_cache_key(model, system_prompt, context)
+        cached = _disk_cache().get(cache_key) if self.load_from_cache else None
+        if cached is not None:
+            print("LLM cache hit")
+            yield cached
+            if on_finish:
+                on_finish('stop')  # only finished answers are cached
+            return
+
+        try:
+            # Estimated prompt tokens plus the full completion budget
+            self.llm_rate_limiter.acquire(_estimate_tokens(system_prompt + context) + _LLM_MAX_TOKENS)
+
+            stream = self.openai_client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": context}
+                ],
+                temperature=0.7,
+                max_tokens=_LLM_MAX_TOKENS,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+
+            chunks = []
+            finish_reason = None
+            for chunk in stream:
+                # Usage arrives on a final chunk with no choices
+                if chunk.usage:
+                    # Surface prompt-cache hits so prompt edits that break caching are visible
+                    print(f"LLM usage: {format_usage(chunk.usage)}")
+                    if on_usage:
+                        on_usage(chunk.usage)
+                if chunk.choices:
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    if chunk.choices[0].delta.content:
+                        chunks.append(chunk.choices[0].delta.content)
+                        yield chunks[-1]
+
+            # Only cache complete, non-empty responses; a 'length' finish was cut
+            # off at max_tokens and must not be served again as a full answer
+            if chunks and finish_reason == 'stop':
+                _disk_cache().set(cache_key, "".join(chunks), expire=_LLM_CACHE_TTL)
+            elif finish_reason == 'length':
+                print(f"{model} output cut off at {_LLM_MAX_TOKENS} tokens")
+            if on_finish:
+                on_finish(finish_reason)
+        except Exception as e:
+            print(f"Error in LLM analysis: {str(e)}")
+
+    def analyze_with_llm(self, scraped_data: List[Dict], serp_data: Dict, on_usage: Callable = None) -> Dict:
+        """Analyze content using LLM"""
         
-        # Get LLM analysis for each aspect
-        analysis = {}
-        for aspect, prompt in prompts.items():
-            print(f"Getting LLM analysis for: {aspect}")
-            analysis[aspect] = self.get_llm_analysis(context, prompt)
-            time.sleep(1)  # Rate limiting
+        # Prepare context for LLM
+        context = self.prepare_llm_context(scraped_data, serp_data)
         
+        # Get LLM analysis for all aspects concurrently; the calls are I/O-bound
+        with ThreadPoolExecutor(max_workers=len(_PROMPTS)) as executor:
+            futures = {}
+            for aspect, prompt in _PROMPTS.items():
+                print(f"Getting LLM analysis for: {aspect}")
+                futures[aspect] = executor.submit(
+                    self.get_llm_analysis, context, prompt, on_usage, _REQUIRED_SECTIONS.get(aspect, ())
+                )
+
+            analysis = {aspect: future.result() for aspect, future in futures.items()}
+
         return analysis
 
     def prepare_llm_context(self, scraped_data: List[Dict], serp_data: Dict) -> str:
         """Prepare context for LLM analysis"""
-        serp_analysis = self.extract_serp_data(serp_data)
+        # Only the top five articles make it into the prompt
+        serp_analysis = self.extract_serp_data(serp_data, organic_limit=5)
         
         context = f"""
-Search Query: {serp_data.get('search_parameters', {}).get('q', '')}
+Primary Keyword: {serp_data.get('search_parameters', {}).get('q', '')}
 
 Content Parameters:
 Article Intent: {self.article_intent}
@@ -288,16 +674,51 @@ Related Searches:
 Competitor Content Analysis:
 {self.format_competitor_content(scraped_data)}
 """
-        return context
+        return _truncate_to_tokens(context, _LLM_CONTEXT_TOKEN_BUDGET)
 
-    def generate_enhanced_outline(self, serp_data: Dict, scraped_data: List[Dict]) -> str:
+    def generate_enhanced_outline(self, serp_data: Dict, scraped_data: List[Dict], on_usage: Callable = None) -> str:
         """Generate enhanced marketing outline using LLM insights"""
         print("Starting LLM analysis...")
-        llm_insights = self.analyze_with_llm(scraped_data, serp_data)
+        llm_insights = self.analyze_with_llm(scraped_data, serp_data, on_usage=on_usage)
         
         print("Formatting final outline...")
         return self.format_llm_outline(llm_insights, serp_data)
 
+    def generate_enhanced_outline_stream(self, serp_data: Dict, scraped_data: List[Dict], on_usage: Callable = None,
+                                         on_finish: Callable = None) -> Iterator[str]:
+        """Stream the enhanced marketing outline, formatted the same way as generate_enhanced_outline"""
+        print("Starting streamed LLM analysis...")
+        context = self.prepare_llm_context(scraped_data, serp_data)
+
+        chunks = self.stream_llm_analysis(
+            context, _OUTLINE_STRUCTURE_PROMPT, on_usage=on_usage, on_finish=on_finish
+        )
+        yield from self.format_llm_outline_chunks(chunks)
+
+    def generate_fallback_outline_stream(self, serp_data: Dict, scraped_data: List[Dict], outline: str,
+                                         on_usage: Callable = None, truncated: bool = False) -> Iterator[str]:
+        """Stream a replacement outline from the fallback model if a streamed one is incomplete.
+
+        outline is the full text from generate_enhanced_outline_stream; pass
+        truncated=True if its stream finished with 'length'. Yields nothing when
+        it is complete and has every required section, so callers keep it.
+        """
+        body = outline
+        if body.startswith(_OUTLINE_HEADER) and body.endswith(_OUTLINE_FOOTER):
+            body = body[len(_OUTLINE_HEADER):-len(_OUTLINE_FOOTER)]
+        if not self._needs_fallback(body.strip(), _REQUIRED_SECTIONS['outline_structure'], truncated):
+            return
+
+        context = self.prepare_llm_context(scraped_data, serp_data)
+        chunks = iter(self.stream_llm_analysis(
+            context, _OUTLINE_STRUCTURE_PROMPT, on_usage=on_usage, model=self.fallback_model
+        ))
+        # If the fallback call fails outright, yield nothing so the first outline stands
+        first = next(chunks, None)
+        if first is None:
+            return
+        yield from self.format_llm_outline_chunks(chain([first], chunks))
+
     # Helper methods with proper error handling
     def format_top_articles(self, results: List[Dict]) -> str:
         try:
@@ -331,49 +752,47 @@ Competitor Content Analysis:
 
     def format_competitor_content(self, scraped_data: List[Dict]) -> str:
         try:
-            content_summary = []
-            for data in scraped_data:
-                analysis = data.get('analysis', {})
-                summary = f"""
+            return "\n".join([
+                self.format_competitor_summary(data)
+                for data in scraped_data
+            ])
+        except Exception as e:
+            print(f"Error formatting competitor content: {str(e)}")
+            return ""
+
+    def format_competitor_summary(self, data: Dict) -> str:
+        analysis = data.get('analysis', {})
+        return f"""
 URL: {data.get('url', '')}
 Word Count: {analysis.get('word_count', 0)}
 Key Topics: {', '.join(analysis.get('key_topics', [])[:5])}
 """
-                content_summary.append(summary)
-            return "\n".join(content_summary)
-        except Exception as e:
-            print(f"Error formatting competitor content: {str(e)}")
-            return ""
 
     def format_llm_outline(self, llm_insights: Dict, serp_data: Dict) -> str:
         """Format LLM insights into the final outline"""
         try:
             # Get the outline structure content
             outline_content = llm_insights.get('outline_structure', 'No outline structure generated')
-            
-            # Remove markdown formatting (** and *)
-            outline_content = outline_content.replace('**', '')
-            outline_content = outline_content.replace('*', '')
-            
-            # Format the outline with proper sections
-            outline = f"""
-Meta Information:
-{outline_content}
-END
-"""
-            return outline.strip()
+            return "".join(self.format_llm_outline_chunks([outline_content]))
         except Exception as e:
             print(f"Error formatting LLM outline: {str(e)}")
             raise Exception(f"Failed to generate outline: {str(e)}")
 
+    def format_llm_outline_chunks(self, chunks: Iterable[str]) -> Iterator[str]:
+        """Format outline text chunks into the final outline as they arrive"""
+        # Format the outline with proper sections
+        yield _OUTLINE_HEADER
+        for chunk in chunks:
+            # Remove markdown formatting (** and *) in one C-level pass. Every
+            # '*' is dropped, so the result does not depend on chunk boundaries.
+            yield chunk.translate(_STAR_TABLE)
+        yield _OUTLINE_FOOTER
+
     def extract_common_phrases(self, text_content: str) -> List[str]:
         """Extract common phrases from text content"""
         try:
-            # Basic phrase extraction using regex
-            phrases = re.findall(r'\b[\w\s]{10,30}\b', text_content.lower())
-            # Count and return most common phrases
-            phrase_counter = Counter(phrases)
-            return [phrase for phrase, count in phrase_counter.most_common(10)]
+            _, phrase_counts, _, _ = _one_pass_stats(text_content)
+            return _top_phrases(phrase_counts)
         except Exception as e:
             print(f"Error extracting common phrases: {str(e)}")
             return []
@@ -381,13 +800,8 @@ END
     def analyze_content_structure(self, text_content: str) -> Dict:
         """Analyze content structure including headings and sections"""
         try:
-            # Basic structure analysis
-            paragraphs = text_content.split('\n\n')
-            structure = {
-                'total_paragraphs': len(paragraphs),
-                'avg_paragraph_length': sum(len(p.split()) for p in paragraphs) / len(paragraphs) if paragraphs else 0,
-            }
-            return structure
+            _, _, total_paragraphs, total_words = _one_pass_stats(text_content)
+            return _content_structure(total_paragraphs, total_words)
         except Exception as e:
             print(f"Error analyzing content structure: {str(e)}")
             return {}
@@ -395,33 +809,171 @@ END
     def extract_key_topics(self, text_content: str) -> List[str]:
         """Extract key topics from content"""
         try:
-            # Simple keyword extraction
-            words = re.findall(r'\b\w+\b', text_content.lower())
-            # Filter common words and get most frequent
-            word_counter = Counter(words)
-            return [word for word, count in word_counter.most_common(10)]
+            word_counts, _, _, _ = _one_pass_stats(text_content)
+            return _top_words(word_counts)
         except Exception as e:
             print(f"Error extracting key topics: {str(e)}")
             return []
 
-    def identify_content_elements(self, content: str) -> Dict:
-        """Identify various content elements like lists, tables, etc."""
+    def identify_content_elements(self, tree: 'lxml.html.HtmlElement') -> Dict:
+        """Identify various content elements like lists, tables, etc. in a parsed page"""
         try:
-            soup = BeautifulSoup(content, 'html.parser')
-            elements = {
-                'lists': len(soup.find_all(['ul', 'ol'])),
-                'tables': len(soup.find_all('table')),
-                'images': len(soup.find_all('img')),
-                'links': len(soup.find_all('a')),
-                'headings': len(soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']))
-            }
-            return elements
+            return {element: int(tree.xpath(xpath)) for element, xpath in _HTML_ELEMENT_XPATHS.items()}
         except Exception as e:
             print(f"Error identifying content elements: {str(e)}")
             return {}
 
-def get_search_results(query: str, api_key: str, num_results: int = 10) -> Dict:
-    """Get search results from SerpAPI with retry logic"""
+def _is_retryable(error: Exception) -> bool:
+    """Network errors, timeouts, 429s and 5xx are worth retrying; other 4xx are final"""
+    # Firecrawl errors carry the HTTP status directly (v2) or on their response (v1)
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    return status is None or status in (408, 429) or status >= 500
+
+def _retry_delay(attempt: int, error: Exception = None) -> float:
+    """Seconds to wait before retry `attempt` (0-based), honoring Retry-After if the error carries one"""
+    delay = min(_BACKOFF_CAP, _BACKOFF_BASE * 2 ** attempt) + random.uniform(0, _BACKOFF_BASE)
+
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        retry_after = float(headers.get('retry-after') or headers.get('Retry-After') or 0)
+    except (TypeError, ValueError):
+        retry_after = 0  # HTTP-date form; fall back to plain backoff
+
+    return max(delay, min(retry_after, _BACKOFF_CAP))
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count for English text (about 4 characters per token)"""
+    return len(text) // 4
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut text to roughly `budget` tokens, ending on a whole line"""
+    if _estimate_tokens(text) <= budget:
+        return text
+    cut = text[:budget * 4]
+    # Competitor summaries come last, so those are dropped first
+    return cut[:cut.rfind('\n') + 1] or cut
+
+def _missing_sections(text: str, required_sections: Sequence[str]) -> List[str]:
+    """Required section names that do not appear in the LLM output"""
+    lowered = text.lower()
+    return [section for section in required_sections if section not in lowered]
+
+def _looks_like_html(content: str) -> bool:
+    """Cheap markup check: HTML documents open with a tag, markdown and text don't"""
+    return content.lstrip()[:1] == '<'
+
+def _parse_html(content: str) -> Optional['lxml.html.HtmlElement']:
+    """Parse an HTML page without its script/style blocks, or None if lxml finds no document"""
+    import lxml.etree
+    import lxml.html
+
+    try:
+        # Parse as UTF-8 bytes so an XML encoding declaration can't trip lxml
+        tree = lxml.html.document_fromstring(
+            content.encode('utf-8'), parser=lxml.html.HTMLParser(encoding='utf-8')
+        )
+    except lxml.etree.ParserError:
+        return None  # empty or comment-only body
+
+    # Code and templates aren't page copy; keep the text that follows them
+    lxml.etree.strip_elements(tree, 'script', 'style', 'noscript', 'template', with_tail=False)
+    return tree
+
+def _markdown_text(content: str) -> str:
+    """Markdown with its syntax removed, leaving the copy a reader sees (paragraph breaks kept)"""
+    text = _MD_SYNTAX_LINE_RE.sub('', content)
+    text = _MD_SYNTAX_PREFIX_RE.sub('', text)
+    return _MD_SYNTAX_INLINE_RE.sub('', text).replace('|', ' ')
+
+def _markdown_tag_counts(content: str) -> Counter:
+    """Count markdown elements under the HTML tag names _content_elements expects"""
+    return Counter({
+        'ul': len(_MD_LIST_RE.findall(content)),
+        'table': len(_MD_TABLE_RE.findall(content)),
+        'img': len(_MD_IMAGE_RE.findall(content)),
+        'a': len(_MD_LINK_RE.findall(content)),
+        'h1': len(_MD_HEADING_RE.findall(content)) + len(_MD_SETEXT_HEADING_RE.findall(content)),
+    })
+
+def _content_elements(tag_counts: Counter) -> Dict:
+    """Map tag-name counts to the content element totals"""
+    return {
+        'lists': tag_counts['ul'] + tag_counts['ol'],
+        'tables': tag_counts['table'],
+        'images': tag_counts['img'],
+        'links': tag_counts['a'],
+        'headings': sum(tag_counts[h] for h in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'))
+    }
+
+def _one_pass_stats(text_content: str, with_phrases: bool = True) -> Tuple[Counter, Counter, int, int]:
+    """Tokenize text once and return (word counts, bigram counts, paragraphs, total words)
+
+    With with_phrases=False the bigram counts are left empty.
+    """
+    words = _WORD_RE.findall(text_content.lower())
+    # Topic counts skip short words and stopwords so they do not crowd out real topics
+    word_counts = Counter(word for word in words if len(word) > 3 and word not in _STOPWORDS)
+    # Adjacent word pairs serve as the page's common phrases; pairs touching a
+    # stopword ("of the", "to your") are filler rather than phrases
+    phrase_counts = Counter(
+        pair for pair in zip(words, islice(words, 1, None))
+        if pair[0] not in _STOPWORDS and pair[1] not in _STOPWORDS
+    ) if with_phrases else Counter()
+    total_paragraphs = text_content.count('\n\n') + 1
+    # Word totals keep whitespace splitting so "don't" and "e-mail" count once
+    return word_counts, phrase_counts, total_paragraphs, len(text_content.split())
+
+def _top_words(word_counts: Counter, n: int = 10) -> List[str]:
+    return [word for word, count in word_counts.most_common(n)]
+
+def _top_phrases(phrase_counts: Counter, n: int = 10) -> List[str]:
+    return [' '.join(phrase) for phrase, count in phrase_counts.most_common(n)]
+
+def _content_structure(total_paragraphs: int, total_words: int) -> Dict:
+    return {
+        'total_paragraphs': total_paragraphs,
+        'avg_paragraph_length': total_words / total_paragraphs,
+    }
+
+def format_usage(usage) -> str:
+    """Summarize OpenAI token usage, including prompt-cache hits"""
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached_tokens = getattr(details, 'cached_tokens', 0) or 0
+    return (f"cached={cached_tokens}/{usage.prompt_tokens} prompt, "
+            f"{usage.completion_tokens} out")
+
+def select_competitor_urls(serp_data: Dict, limit: int = 5) -> Tuple[str, ...]:
+    """Pick the top organic result URLs worth scraping, skipping social/video sites and duplicates"""
+    urls = []
+    seen = set()
+    for result in serp_data.get('organic_results', ()):
+        if len(urls) == limit:
+            break
+        link = result.get('link', '')
+        if not link or _BLOCKED_DOMAINS.search(link):
+            continue
+        key = _canonical_url(link)
+        if key not in seen:
+            seen.add(key)
+            urls.append(link)
+    # A tuple is hashable for caching
+    return tuple(urls)
+
+def _canonical_url(link: str) -> Tuple[str, str, str]:
+    """Identity of a page for dedupe: host without www., path and sorted query, minus tracking parameters"""
+    parts = urlsplit(link.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    # Tracking parameters and the fragment don't change the page; the rest of the query can
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _TRACKING_PARAM_RE.match(name)
+    )
+    return host, parts.path.rstrip('/') or '/', urlencode(query)
+
+def get_search_results(query: str, api_key: str, num_results: int = 10, load_from_cache: bool = True) -> Dict:
+    """Get search results from SerpAPI; retries are handled by the shared session"""
     url = "https://serpapi.com/search"
     params = {
         "q": query,
@@ -430,25 +982,40 @@ def get_search_results(query: str, api_key: str, num_results: int = 10) -> Dict:
         "hl": "en",  # Language
         "gl": "us"   # Country
     }
-    
-    max_retries = 3
-    for attempt in range(max_retries):
+
+    # Rankings for a query move slowly, so reuse a recent response (the API key is not part of the key)
+    digest = hashlib.sha256(
+        f"{query}\0{num_results}\0{params['gl']}\0{params['hl']}".encode('utf-8')
+    ).hexdigest()
+    cache_key = f"serp::{digest}"
+    if load_from_cache:
+        cached = _disk_cache().get(cache_key)
+        if cached is not None:
+            print("SERP cache hit")
+            return cached
+
+    try:
+        response = _SERP_SESSION.get(url, params=params, timeout=30)
+    except requests.exceptions.RequestException as e:
+        print(f"SERP request failed after retries: {str(e)}")
+        return None
+
+    if response.status_code == 200:
+        # SERP payloads run to hundreds of KB; orjson parses them several times faster
         try:
-            response = requests.get(url, params=params, timeout=30)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"Error: {response.status_code}, {response.text}")
-        except requests.exceptions.RequestException as e:
-            if attempt == max_retries - 1:
-                print(f"Failed after {max_retries} attempts: {str(e)}")
-                return None
-            print(f"Attempt {attempt + 1} failed, retrying...")
-            time.sleep(2)  # Wait 2 seconds before retrying
-    
+            serp_data = orjson.loads(response.content)
+        except orjson.JSONDecodeError as e:
+            print(f"SERP response was not valid JSON: {str(e)}")
+            return None
+        _disk_cache().set(cache_key, serp_data, expire=_SERP_CACHE_TTL)
+        return serp_data
+
+    print(f"Error: {response.status_code}, {response.text}")
     return None
 
 def main():
+    import streamlit as st
+
     try:
         # API Keys
 # In your streamlit_app.py
@@ -456,33 +1023,41 @@ def main():
         OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
         SERPAPI_KEY = st.secrets["SERPAPI_KEY"]
 
+        # Set to False to force fresh SERP, scrape and LLM calls (responses are still re-cached)
+        load_from_cache = True
+
         # Get search query from user
         search_query = input("Enter your search query: ")
 
-        # Get SERP data directly using SerpAPI
+        # Get SERP data directly using SerpAPI while the analyzer is initialized
         print("Fetching SERP data...")
-        serp_data = get_search_results(search_query, SERPAPI_KEY)
-        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            serp_future = executor.submit(
+                get_search_results, search_query, SERPAPI_KEY, load_from_cache=load_from_cache
+            )
+
+            # Initialize analyzer with API keys
+            analyzer_future = executor.submit(
+                LLMEnhancedAnalyzer,
+                firecrawl_api_key=FIRECRAWL_API_KEY,
+                openai_api_key=OPENAI_API_KEY,
+                load_from_cache=load_from_cache
+            )
+            analyzer = analyzer_future.result()
+
+            # Set default content parameters
+            analyzer.set_content_parameters(
+                intent="commercial",  # Default intent
+                keywords=[]  # Empty keywords list
+            )
+
+            serp_data = serp_future.result()
+
         if not serp_data: 
             raise Exception("Failed to fetch SERP data")
-
-        # Initialize analyzer with API keys
-        analyzer = LLMEnhancedAnalyzer(
-            firecrawl_api_key=FIRECRAWL_API_KEY,
-            openai_api_key=OPENAI_API_KEY
-        )
-        
-        # Set default content parameters
-        analyzer.set_content_parameters(
-            intent="commercial",  # Default intent
-            keywords=[]  # Empty keywords list
-        )
         
         # Extract URLs to scrape
-        urls_to_scrape = [
-            result['link'] 
-            for result in serp_data.get('organic_results', [])[:5]
-        ]
+        urls_to_scrape = select_competitor_urls(serp_data)
         
         # Scrape competitor content
         print("Scraping competitor content...")
@@ -494,8 +1069,7 @@ def main():
         
         # Save the enhanced outline
         print("Saving outline...")
-        with open('landing outline5.txt', 'w', encoding='utf-8') as f:
-            f.write(enhanced_outline)
+        Path('landing outline5.txt').write_text(enhanced_outline, encoding='utf-8')
         
         print("LLM-enhanced marketing outline generated successfully!")
         
@@ -0,0 +1,377 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import lg
+
+
+def _http_error(status=None, headers=None):
+    error = Exception("boom")
+    error.response = SimpleNamespace(status_code=status, headers=headers or {})
+    return error
+
+
+def test_retry_delay_grows_exponentially_and_caps(monkeypatch):
+    monkeypatch.setattr(lg.random, 'uniform', lambda a, b: 0)
+    assert [lg._retry_delay(attempt) for attempt in range(4)] == [1.0, 2.0, 4.0, 8.0]
+    assert lg._retry_delay(20) == lg._BACKOFF_CAP
+
+
+def test_retry_delay_adds_jitter_within_base(monkeypatch):
+    monkeypatch.setattr(lg.random, 'uniform', lambda a, b: b)
+    assert lg._retry_delay(0) == 1.0 + lg._BACKOFF_BASE
+
+
+def test_retry_delay_honors_longer_retry_after(monkeypatch):
+    monkeypatch.setattr(lg.random, 'uniform', lambda a, b: 0)
+    assert lg._retry_delay(0, _http_error(429, {'Retry-After': '7'})) == 7.0
+    assert lg._retry_delay(3, _http_error(429, {'retry-after': '2'})) == 8.0
+    assert lg._retry_delay(0, _http_error(429, {'Retry-After': '3600'})) == lg._BACKOFF_CAP
+
+
+def test_retry_delay_ignores_unparseable_retry_after(monkeypatch):
+    monkeypatch.setattr(lg.random, 'uniform', lambda a, b: 0)
+    headers = {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+    assert lg._retry_delay(1, _http_error(503, headers)) == 2.0
+    assert lg._retry_delay(1, ValueError("no response")) == 2.0
+
+
+class _FakeClock:
+    """Stands in for time.monotonic/time.sleep so limiter waits are instant"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _fake_clock(monkeypatch):
+    clock = _FakeClock()
+    monkeypatch.setattr(lg.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(lg.time, 'sleep', clock.sleep)
+    return clock
+
+
+def test_rate_limiter_admits_within_limits_without_waiting(monkeypatch):
+    clock = _fake_clock(monkeypatch)
+    limiter = lg.RateLimiter(rpm_limit=3, tpm_limit=100)
+    for _ in range(3):
+        limiter.acquire(10)
+    assert clock.sleeps == []
+
+
+def test_rate_limiter_waits_for_request_slot(monkeypatch):
+    clock = _fake_clock(monkeypatch)
+    limiter = lg.RateLimiter(rpm_limit=2, tpm_limit=1000)
+    limiter.acquire(1)
+    clock.now += 10
+    limiter.acquire(1)
+    limiter.acquire(1)
+    # The first request leaves the window 60s after it was admitted
+    assert sum(clock.sleeps) == 50
+
+
+def test_rate_limiter_waits_for_token_budget(monkeypatch):
+    clock = _fake_clock(monkeypatch)
+    limiter = lg.RateLimiter(rpm_limit=100, tpm_limit=100)
+    limiter.acquire(80)
+    limiter.acquire(30)
+    assert sum(clock.sleeps) == 60
+
+
+def test_rate_limiter_clamps_oversized_requests(monkeypatch):
+    clock = _fake_clock(monkeypatch)
+    limiter = lg.RateLimiter(rpm_limit=100, tpm_limit=100)
+    # More tokens than a whole minute's budget would otherwise block forever
+    limiter.acquire(500)
+    assert clock.sleeps == []
+
+
+def test_markdown_counts_atx_and_setext_headings():
+    content = "# Title\n\nIntro\n\nFeatures\n========\n\nPricing\n-------\n\n## Steps\n"
+    assert lg._markdown_tag_counts(content)['h1'] == 4
+
+
+def test_markdown_rules_and_list_items_are_not_setext_headings():
+    content = "Intro paragraph\n\n---\n\n- item\n---\n\n# Heading\n---\n\n***\n---\n"
+    assert lg._markdown_tag_counts(content)['h1'] == 1
+
+
+def test_markdown_counts_lists_as_runs_of_items():
+    content = "- one\n- two\n  - nested\n\ntext\n\n1. first\n2) second\n"
+    assert lg._markdown_tag_counts(content)['ul'] == 2
+
+
+def test_markdown_counts_tables_images_and_links():
+    content = (
+        "| Plan | Price |\n|------|------:|\n| Basic | $10 |\n\n"
+        "![logo](https://example.com/logo.png)\n\n"
+        "See [pricing](https://example.com/pricing) and [docs](https://example.com/docs).\n"
+    )
+    counts = lg._markdown_tag_counts(content)
+    assert (counts['table'], counts['img'], counts['a']) == (1, 1, 2)
+    assert lg._content_elements(counts) == {
+        'lists': 0, 'tables': 1, 'images': 1, 'links': 2, 'headings': 0
+    }
+
+
+def test_missing_sections_is_case_insensitive_and_ordered():
+    text = "META TITLE: Uber Clone\nFAQs\n"
+    assert lg._missing_sections(text, ('meta title', 'meta description', 'faq')) == ['meta description']
+    assert lg._missing_sections(text, ()) == []
+    assert lg._missing_sections("", ('faq',)) == ['faq']
+
+
+_MARKDOWN_PAGE = """# Uber Clone App
+
+Launch your **ride sharing** app.
+
+Why it works
+------------
+
+- Fast setup
+* White label
+1. Go live
+
+| Plan | Price |
+|------|------:|
+| Basic | $99 |
+
+---
+
+![Screenshot](https://example.com/app.png)
+
+> Read the [pricing guide](https://example.com/pricing).
+"""
+
+
+def test_markdown_text_drops_syntax_but_keeps_copy():
+    text = lg._markdown_text(_MARKDOWN_PAGE)
+    for syntax in ('#', '---', '|', '![', '](', 'https://'):
+        assert syntax not in text
+    assert not [line for line in text.splitlines() if line.lstrip()[:2] in ('> ', '- ', '* ', '1.')]
+    assert "Launch your **ride sharing** app." in text
+    assert "Read the pricing guide." in text
+
+
+def test_analyze_content_counts_markdown_copy_words_only():
+    analyzer = lg.LLMEnhancedAnalyzer.__new__(lg.LLMEnhancedAnalyzer)
+    analysis = analyzer.analyze_content(_MARKDOWN_PAGE)
+    assert analysis['word_count'] == 25
+    assert 'https' not in analysis['key_topics']
+
+
+def _outline_analyzer(fallback_chunks):
+    analyzer = lg.LLMEnhancedAnalyzer.__new__(lg.LLMEnhancedAnalyzer)
+    analyzer.model = "small"
+    analyzer.fallback_model = "large"
+    analyzer.prepare_llm_context = lambda scraped_data, serp_data: "context"
+    analyzer.calls = []
+
+    def stream(context, system_prompt, on_usage=None, model=None, on_finish=None):
+        analyzer.calls.append(model)
+        yield from fallback_chunks
+        if on_finish:
+            on_finish('stop')
+
+    analyzer.stream_llm_analysis = stream
+    return analyzer
+
+
+def _formatted(body):
+    return lg._OUTLINE_HEADER + body + lg._OUTLINE_FOOTER
+
+
+def test_fallback_outline_stream_skips_complete_outlines():
+    analyzer = _outline_analyzer(["unused"])
+    outline = _formatted("Meta Title: x\nMeta Description: y\nFAQ\n")
+    assert list(analyzer.generate_fallback_outline_stream({}, [], outline)) == []
+    assert analyzer.calls == []
+
+
+def test_fallback_outline_stream_regenerates_incomplete_outlines():
+    analyzer = _outline_analyzer(["Meta Title: x\n", "Meta Description: y\n", "**FAQ**"])
+    regenerated = "".join(analyzer.generate_fallback_outline_stream({}, [], _formatted("Meta Title: x\n")))
+    assert regenerated == _formatted("Meta Title: x\nMeta Description: y\nFAQ")
+    assert analyzer.calls == ["large"]
+
+
+def test_fallback_outline_stream_keeps_first_outline_when_fallback_fails():
+    analyzer = _outline_analyzer([])
+    assert list(analyzer.generate_fallback_outline_stream({}, [], _formatted("Meta Title: x\n"))) == []
+
+
+def test_fallback_outline_stream_does_not_retry_empty_outlines():
+    analyzer = _outline_analyzer(["unused"])
+    assert list(analyzer.generate_fallback_outline_stream({}, [], _formatted(""))) == []
+    assert analyzer.calls == []
+
+
+def test_estimate_tokens_uses_four_characters_per_token():
+    assert lg._estimate_tokens("") == 0
+    assert lg._estimate_tokens("x" * 41) == 10
+
+
+def test_truncate_to_tokens_keeps_short_text():
+    assert lg._truncate_to_tokens("one\ntwo\n", 10) == "one\ntwo\n"
+
+
+def test_truncate_to_tokens_cuts_on_a_line_boundary():
+    text = "a" * 7 + "\n" + "b" * 20 + "\n"
+    assert lg._truncate_to_tokens(text, 3) == "a" * 7 + "\n"
+
+
+def test_truncate_to_tokens_cuts_mid_line_without_newlines():
+    assert lg._truncate_to_tokens("x" * 100, 5) == "x" * 20
+
+
+def test_analyze_content_ignores_script_and_style_text():
+    analyzer = lg.LLMEnhancedAnalyzer.__new__(lg.LLMEnhancedAnalyzer)
+    html = (
+        "<html><head><style>body { color: red }</style></head><body>"
+        "<script>var tracking = 1;</script><p>Ride sharing app</p><noscript>enable</noscript> clone"
+        "</body></html>"
+    )
+    analysis = analyzer.analyze_content(html)
+    assert analysis['word_count'] == 4
+    assert 'tracking' not in analysis['key_topics']
+
+
+def test_analyze_content_reports_no_copy_for_empty_documents():
+    analyzer = lg.LLMEnhancedAnalyzer.__new__(lg.LLMEnhancedAnalyzer)
+    analysis = analyzer.analyze_content("<!-- nothing here -->", full=True)
+    assert analysis['word_count'] == 0
+    assert analysis['key_topics'] == []
+    assert analysis['common_phrases'] == []
+    assert analysis['content_elements'] == {'lists': 0, 'tables': 0, 'images': 0, 'links': 0, 'headings': 0}
+
+
+@pytest.mark.parametrize("status", [None, 408, 429, 500, 503])
+def test_is_retryable_for_transient_failures(status):
+    assert lg._is_retryable(_http_error(status))
+
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404])
+def test_is_not_retryable_for_permanent_client_errors(status):
+    assert not lg._is_retryable(_http_error(status))
+
+
+def test_is_retryable_reads_status_code_on_the_error():
+    error = Exception("forbidden")
+    error.status_code = 403
+    assert not lg._is_retryable(error)
+    assert lg._is_retryable(TimeoutError())
+
+
+def test_canonical_url_ignores_tracking_parameters_and_fragment():
+    assert lg._canonical_url("https://www.Example.com/pricing/?utm_source=x&gclid=1#plans") == \
+        lg._canonical_url("http://example.com/pricing")
+
+
+def test_canonical_url_keeps_other_query_parameters_sorted():
+    assert lg._canonical_url("https://example.com/p?b=2&a=1&fbclid=z") == ('example.com', '/p', 'a=1&b=2')
+    assert lg._canonical_url("https://example.com/p?id=1") != lg._canonical_url("https://example.com/p?id=2")
+
+
+def test_select_competitor_urls_skips_blocked_and_duplicate_links():
+    serp_data = {'organic_results': [
+        {'link': 'https://www.youtube.com/watch?v=1'},
+        {'link': 'https://example.com/clone'},
+        {'link': 'https://example.com/clone/?utm_medium=cpc'},
+        {'title': 'no link'},
+        {'link': 'https://other.com/?page=2'},
+        {'link': 'https://third.com/'},
+    ]}
+    assert lg.select_competitor_urls(serp_data, limit=2) == ('https://example.com/clone', 'https://other.com/?page=2')
+
+
+def test_fallback_outline_stream_regenerates_truncated_outlines():
+    analyzer = _outline_analyzer(["Meta Title: x\nMeta Description: y\nFAQ\nStep 4"])
+    outline = _formatted("Meta Title: x\nMeta Description: y\nFAQ\nStep 3")
+    assert list(analyzer.generate_fallback_outline_stream({}, [], outline, truncated=True))
+    assert analyzer.calls == ["large"]
+
+
+def test_get_llm_analysis_retries_output_cut_off_at_max_tokens():
+    analyzer = _outline_analyzer([])
+    finish_reasons = {"small": "length", "large": "stop"}
+
+    def stream(context, system_prompt, on_usage=None, model=None, on_finish=None):
+        model = model or analyzer.model
+        analyzer.calls.append(model)
+        yield f"{model} answer"
+        if on_finish:
+            on_finish(finish_reasons[model])
+
+    analyzer.stream_llm_analysis = stream
+    assert analyzer.get_llm_analysis("context", "prompt") == "large answer"
+    assert analyzer.calls == ["small", "large"]
+
+    finish_reasons["small"] = "stop"
+    analyzer.calls = []
+    assert analyzer.get_llm_analysis("context", "prompt") == "small answer"
+    assert analyzer.calls == ["small"]
+
+
+def test_extract_serp_data_keeps_every_paa_question_and_related_search():
+    analyzer = lg.LLMEnhancedAnalyzer.__new__(lg.LLMEnhancedAnalyzer)
+    data = {
+        'organic_results': [{'link': f'https://example.com/{i}'} for i in range(12)],
+        'related_questions': [{'question': f'q{i}'} for i in range(12)],
+        'related_searches': [{'query': f's{i}'} for i in range(12)],
+    }
+    serp = analyzer.extract_serp_data(data, organic_limit=5)
+    assert len(serp['organic_results']) == 5
+    assert len(serp['paa_questions']) == 12
+    assert len(serp['related_searches']) == 12
+
+
+def test_get_search_results_returns_none_for_a_non_json_body(monkeypatch):
+    response = SimpleNamespace(status_code=200, content=b"<html>maintenance</html>", text="<html>maintenance</html>")
+    monkeypatch.setattr(lg._SERP_SESSION, 'get', lambda url, params, timeout: response)
+    assert lg.get_search_results("uber clone", "key", load_from_cache=False) is None
+
+
+class _MemoryCache(dict):
+    def set(self, key, value, expire=None):
+        self[key] = value
+
+
+def _scraping_analyzer(monkeypatch, pages, delays):
+    monkeypatch.setattr(lg, '_disk_cache', lambda cache=_MemoryCache(): cache)
+    analyzer = lg.LLMEnhancedAnalyzer.__new__(lg.LLMEnhancedAnalyzer)
+    analyzer.scrape_format = 'markdown'
+    analyzer.load_from_cache = False
+
+    def scrape_url(url, params):
+        time.sleep(delays.get(url, 0))
+        return {'markdown': pages[url]}
+
+    analyzer.firecrawl = SimpleNamespace(scrape_url=scrape_url)
+    return analyzer
+
+
+def test_scrape_keeps_the_highest_ranked_copy_of_duplicate_content(monkeypatch):
+    pages = {
+        'https://dup1.com/': "Same syndicated article",
+        'https://dup2.com/': "Same syndicated article",
+        'https://other.com/': "A different page",
+    }
+    # The lower-ranked copy finishes first
+    analyzer = _scraping_analyzer(monkeypatch, pages, {'https://dup1.com/': 0.05})
+    scraped = analyzer.scrape_competitor_content(list(pages))
+    assert [page['url'] for page in scraped] == ['https://dup1.com/', 'https://other.com/']
+
+
+def test_scrape_does_not_dedupe_empty_pages(monkeypatch):
+    pages = {'https://a.com/': "", 'https://b.com/': "", 'https://c.com/': "Copy"}
+    analyzer = _scraping_analyzer(monkeypatch, pages, {})
+    scraped = analyzer.scrape_competitor_content(list(pages))
+    assert [page['url'] for page in scraped] == list(pages)